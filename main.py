@@ -1,10 +1,13 @@
 import uasyncio as asyncio
-import socket
 import ssl
 import network
 import time
 import os
 import gc
+import micropython
+import struct
+import sys
+from collections import OrderedDict
 from machine import ADC, Pin, I2C
 
 from wifisetup import *
@@ -29,19 +32,31 @@ FILE_PORT = 12346  # secure file transfer port
 
 CACHE_ENABLED = True
 CACHE_MAX_SIZE = 50
+CACHE_TTL_MS = 5000  # serve cache hits without re-checking mtime for this long
+STREAM_THRESHOLD = 8192  # files larger than this are streamed, not cached
+FILE_BUFFER_SIZE = 1024
+LOG_ENABLED = True  # per-request logging
+LOG_BUFFER_SIZE = 4096  # request log bytes kept between flushes
 UPDATE_INTERVAL = 1  # OLED stats update interval
+GC_MIN_FREE = 20000  # collect before serving a client when free heap is below this
+
+PUBLIC_ROOT = PUBLIC_DIR.strip("/")
+INDEX_REQUEST = "/index.gmi"
+INDEX_PATH = PUBLIC_ROOT + INDEX_REQUEST
+S_IFDIR = 0x4000
+S_IFREG = 0x8000
 
 # Global variables
-file_cache = {}
+file_cache = OrderedDict()  # LRU order: least recently used first
+dir_cache = OrderedDict()  # {link prefix: (response bytes, dir mtime, ticks built)}
 start_time = time.ticks_ms()
 total_clients = 0
 max_clients_per_sec = 0
 clients_this_sec = 0
-last_sec_tick = int(time.time())
-last_update = time.ticks_ms()
+last_sec_tick = time.ticks_ms() // 1000
+log_buf = bytearray()  # request log lines awaiting flush_log()
 udp_sock = None
 wlan = None
-client_uploads = {}  # {(ip, port): {filename: {"chunks": {}, "total": int}}}
 
 # --- OLED init ---
 if ENABLE_OLED:
@@ -50,22 +65,35 @@ if ENABLE_OLED:
     oled.contrast(50)
 
 # --- Helpers ---
-def safe_join(base, *paths):
-    full = "/".join([base.strip("/")] + [p.strip("/") for p in paths])
-    if ".." in full:
+@micropython.native
+def safe_join(base, path):
+    # base is always PUBLIC_ROOT or a path already returned by safe_join
+    if ".." in path:
         return None
-    return full
+    path = path.strip("/")
+    return base + "/" + path if path else base
+
+def path_exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+def collect_if_low():
+    # Collect between clients, not mid-handshake or mid-transfer
+    if gc.mem_free() < GC_MIN_FREE:
+        gc.collect()
+
+# On-chip temperature sensor (ADC channel 4) and its conversion constants
+TEMP_ADC = ADC(4)
+TEMP_VOLTS_PER_COUNT = 3.3 / 65535
+TEMP_DEGREES_PER_VOLT = 1 / 0.001721
 
 def read_chip_temp():
-    sensor = ADC(4)
-    reading = sensor.read_u16()
-    voltage = reading * 3.3 / 65535
-    return 27 - (voltage - 0.706) / 0.001721
+    return 27 - (TEMP_ADC.read_u16() * TEMP_VOLTS_PER_COUNT - 0.706) * TEMP_DEGREES_PER_VOLT
 
-def display_stats(total_clients, max_clients_per_sec, start_time):
-    if not ENABLE_OLED:
-        return
-    gc.collect()
+def render_stats():
     elapsed_ms = time.ticks_diff(time.ticks_ms(), start_time)
     elapsed_sec = int(elapsed_ms / 1000)
     hours = elapsed_sec // 3600
@@ -74,74 +102,196 @@ def display_stats(total_clients, max_clients_per_sec, start_time):
     avg_clients_per_sec = total_clients / elapsed_sec if elapsed_sec > 0 else 0
     temp_c = read_chip_temp()
     free_mem = gc.mem_free()
+    return (
+        "Runtime {:02}:{:02}:{:02}".format(hours, minutes, seconds),
+        "Tot Clients: {}".format(total_clients),
+        "Avg/s: {:.2f}".format(avg_clients_per_sec),
+        "Free mem: {}".format(free_mem),
+        "Chip Temp: {:.1f}C".format(temp_c),
+        "IP: {}".format(wlan.ifconfig()[0]),
+    )
+
+def display_stats(lines):
     oled.fill(0)
-    oled.text("Runtime {:02}:{:02}:{:02}".format(hours, minutes, seconds), 0, 0)
-    oled.text("Tot Clients: {}".format(total_clients), 0, 10)
-    oled.text("Avg/s: {:.2f}".format(avg_clients_per_sec), 0, 20)
-    oled.text("Free mem: {}".format(free_mem), 0, 30)
-    oled.text("Chip Temp: {:.1f}C".format(temp_c), 0, 40)
-    oled.text("IP: {}".format(wlan.ifconfig()[0]), 0, 50)
+    for i, line in enumerate(lines):
+        oled.text(line, 0, i * 10)
     oled.show()
 
 def log_request(client_addr, request, status):
+    global log_buf
+    if not LOG_ENABLED:
+        return
     t = time.localtime()
     timestamp = "{:04}-{:02}-{:02} {:02}:{:02}:{:02}".format(
         t[0], t[1], t[2], t[3], t[4], t[5]
     )
-    print(f"[{timestamp}] {client_addr} -> {request} ({status})")
+    log_buf += f"[{timestamp}] {client_addr} -> {request} ({status})\n".encode()
+    if len(log_buf) > LOG_BUFFER_SIZE:
+        # Drop the oldest lines, cutting at a line boundary
+        # (bytearray has no find() in MicroPython, so search a bytes copy)
+        tail = bytes(log_buf[-LOG_BUFFER_SIZE:])
+        log_buf = bytearray(tail[tail.find(b"\n") + 1:])
+
+def flush_log():
+    global log_buf
+    if log_buf:
+        sys.stdout.write(log_buf.decode())
+        log_buf = bytearray()
+
+# --- Request helpers ---
+MAX_REQUEST_SIZE = 1026  # 1024-byte URL + CRLF
+READ_CHUNK_SIZE = 256
+REQUEST_TIMEOUT = 10  # seconds a client gets to send its request line
+REQUEST_POOL_SIZE = 4  # receive buffers kept for reuse; extras are freed
+
+_request_buffers = []  # pool of reusable receive buffers
+
+async def read_request(reader):
+    buf = _request_buffers.pop() if _request_buffers else bytearray(MAX_REQUEST_SIZE)
+    mv = memoryview(buf)
+    n = 0
+    try:
+        while n < MAX_REQUEST_SIZE:
+            k = await reader.readinto(mv[n:n + READ_CHUNK_SIZE])
+            if k is None:  # TLS record not complete yet
+                continue
+            if not k:
+                break
+            n += k
+            # End on LF so bare-LF clients are served too. MicroPython's
+            # bytearray has no find(); search a bytes copy of just the new
+            # data (the pooled buffer holds stale bytes past n)
+            if b"\n" in bytes(mv[n - k:n]):
+                break
+        return bytes(mv[:n]).strip()
+    finally:
+        if len(_request_buffers) < REQUEST_POOL_SIZE:
+            _request_buffers.append(buf)
 
 # --- File helpers ---
 MIME_TYPES = {
-    ".gmi": "text/gemini",
-    ".txt": "text/plain",
-    ".html": "text/html",
-    ".css": "text/css",
-    ".js": "application/javascript",
-    ".png": "image/png",
-    ".jpg": "image/jpeg",
-    ".jpeg": "image/jpeg",
-    ".gif": "image/gif",
-    ".pdf": "application/pdf",
+    "gmi": "text/gemini",
+    "txt": "text/plain",
+    "html": "text/html",
+    "css": "text/css",
+    "js": "application/javascript",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "pdf": "application/pdf",
 }
+DEFAULT_MIME_TYPE = "application/octet-stream"
 
-def get_mime_type(filename):
-    for ext, mime in MIME_TYPES.items():
-        if filename.endswith(ext):
-            return mime
-    return "application/octet-stream"
+# Pre-encoded response headers
+HEADERS = {mime: f"20 {mime}\r\n".encode() for mime in MIME_TYPES.values()}
+HEADERS[DEFAULT_MIME_TYPE] = f"20 {DEFAULT_MIME_TYPE}\r\n".encode()
+HDR_GEMINI = HEADERS["text/gemini"]
+HDR_NOT_FOUND = b"51 Not Found\r\n"
 
-def get_file_content(filepath):
-    try:
-        st = os.stat(filepath)
-        mtime = st[8]
-    except OSError:
+@micropython.native
+def get_mime_type(filename):
+    i = filename.rfind(".")
+    if i < 0:
+        return DEFAULT_MIME_TYPE
+    return MIME_TYPES.get(filename[i + 1:], DEFAULT_MIME_TYPE)
+
+# Cache entries: (response bytes, mime type, mtime, ticks of last mtime check)
+def get_cached_response(filepath):
+    if not CACHE_ENABLED or filepath not in file_cache:
+        return None
+    entry = file_cache[filepath]
+    if time.ticks_diff(time.ticks_ms(), entry[3]) >= CACHE_TTL_MS:
         return None
+    # Re-insert to mark as most recently used (no move_to_end in MicroPython)
+    file_cache[filepath] = file_cache.pop(filepath)
+    return entry
+
+def get_file_response(filepath, mtime):
+    now = time.ticks_ms()
     if CACHE_ENABLED and filepath in file_cache:
-        cached_content, cached_mtime = file_cache[filepath]
+        response, mime_type, cached_mtime, _ = file_cache.pop(filepath)
         if cached_mtime == mtime:
-            return cached_content
+            entry = (response, mime_type, mtime, now)
+            file_cache[filepath] = entry
+            return entry
     try:
+        mime_type = get_mime_type(filepath)
         with open(filepath, "rb") as f:
-            content = f.read()
+            response = HEADERS[mime_type] + f.read()
+        entry = (response, mime_type, mtime, now)
         if CACHE_ENABLED:
             if len(file_cache) >= CACHE_MAX_SIZE:
                 file_cache.pop(next(iter(file_cache)))
-            file_cache[filepath] = (content, mtime)
-        return content
+            file_cache[filepath] = entry
+        return entry
     except OSError:
         return None
 
+def get_dir_listing(filepath, base, mtime):
+    now = time.ticks_ms()
+    if CACHE_ENABLED and base in dir_cache:
+        # Adding a file does not reliably bump the directory's mtime, so
+        # listings are also rebuilt once they are older than CACHE_TTL_MS
+        cached_listing, cached_mtime, built = dir_cache[base]
+        if cached_mtime == mtime and time.ticks_diff(now, built) < CACHE_TTL_MS:
+            return cached_listing
+    lines = []
+    for entry in sorted(os.listdir(filepath)):
+        full_entry = safe_join(filepath, entry)
+        if not full_entry:
+            continue
+        ep = base + "/" + entry
+        try:
+            est = os.stat(full_entry)
+            if est[0] & S_IFDIR:
+                ep += "/"
+        except OSError:
+            pass
+        lines.append(f"=> {ep} {entry}")
+    listing = HDR_GEMINI + "\n".join(lines).encode()
+    if CACHE_ENABLED:
+        if len(dir_cache) >= CACHE_MAX_SIZE:
+            dir_cache.pop(next(iter(dir_cache)))
+        dir_cache[base] = (listing, mtime, now)
+    return listing
+
+def invalidate_cache(filepath):
+    file_cache.pop(filepath, None)
+    # Directory mtimes are not reliably updated on every filesystem
+    dir_cache.clear()
+
+# Shared by all streams: each chunk is handed to the writer before any await
+_file_buffer = bytearray(FILE_BUFFER_SIZE)
+_file_buffer_mv = memoryview(_file_buffer)
+
+async def stream_file(writer, filepath, mime_type):
+    try:
+        f = open(filepath, "rb")
+    except OSError:
+        return False
+    with f:
+        writer.write(HEADERS[mime_type])
+        while True:
+            n = f.readinto(_file_buffer)
+            if not n:
+                break
+            writer.write(_file_buffer_mv[:n])
+            await writer.drain()
+    return True
+
 # --- Wi-Fi ---
-def connect_to_wifi():
+async def connect_to_wifi():
     global wlan
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
     wlan.connect(SSID, PASSWORD)
-    for _ in range(10):
+    for i in range(100):
         if wlan.isconnected():
             break
-        print(".", end="")
-        time.sleep(1)
+        if i % 10 == 0:
+            print(".", end="")
+        await asyncio.sleep_ms(100)
     if wlan.isconnected():
         print("\nConnected! IP:", wlan.ifconfig()[0])
         return wlan
@@ -168,11 +318,13 @@ async def wifi_watchdog():
 # --- Gemini TLS Server ---
 async def handle_gemini_client(reader, writer):
     global total_clients, clients_this_sec, max_clients_per_sec, last_sec_tick
+    collect_if_low()
     addr = writer.get_extra_info('peername')
+    write = writer.write
     total_clients += 1
     clients_this_sec += 1
 
-    current_sec = int(time.time())
+    current_sec = time.ticks_ms() // 1000
     if current_sec != last_sec_tick:
         if clients_this_sec > max_clients_per_sec:
             max_clients_per_sec = clients_this_sec
@@ -180,170 +332,215 @@ async def handle_gemini_client(reader, writer):
         last_sec_tick = current_sec
 
     try:
-        request = await reader.read(1024)
-        request = request.decode().strip()
+        # Parse as bytes; only the path is decoded
+        request = await asyncio.wait_for(read_request(reader), REQUEST_TIMEOUT)
+        if not request:
+            raise ValueError("empty request")
+        if request.startswith(b"gemini://"):
+            path_start = request.find(b"/", 9)
+            request = request[path_start:] if path_start != -1 else b"/"
+        request = INDEX_REQUEST if request == b"/" else request.decode()
     except:
         writer.close()
         await writer.wait_closed()
         return
 
-    if request.startswith("gemini://"):
-        path_start = request.find("/", 9)
-        request = request[path_start:] if path_start != -1 else "/"
-    if request == "/":
-        request = "/index.gmi"
-
-    filepath = safe_join(PUBLIC_DIR, request.lstrip("/"))
+    # The root index is the most common request; its path is precomputed
+    if request == INDEX_REQUEST:
+        filepath = INDEX_PATH
+    else:
+        filepath = safe_join(PUBLIC_ROOT, request)
     status = ""
-    try:
-        st = os.stat(filepath)
-        is_dir = st[0] & 0x4000
-        is_file = st[0] & 0x8000
-    except OSError:
-        is_dir = is_file = False
+    cached = get_cached_response(filepath)
+    is_dir = is_file = False
+    if cached is None and filepath:
+        try:
+            st = os.stat(filepath)
+            is_dir = st[0] & S_IFDIR
+            is_file = st[0] & S_IFREG
+        except OSError:
+            # Deleted outside the file server; drop any expired cache entry
+            file_cache.pop(filepath, None)
 
     try:
-        if is_dir:
-            if ENABLE_DIR_LISTING:
-                entries = sorted(os.listdir(filepath))
-                lines = []
-                for entry in entries:
-                    ep = request.rstrip("/") + "/" + entry
-                    full_entry = safe_join(filepath, entry)
-                    try:
-                        est = os.stat(full_entry)
-                        if est[0] & 0x4000:
-                            ep += "/"
-                    except OSError:
-                        pass
-                    lines.append(f"=> {ep} {entry}")
-                writer.write(b"20 text/gemini\r\n")
-                writer.write("\n".join(lines).encode())
-                status = "20 Directory Listing"
-            else:
-                writer.write(b"51 Not Found\r\n")
-                status = "51 Not Found"
-        elif is_file:
-            content = get_file_content(filepath)
-            if content:
+        try:
+            if cached is not None:
+                write(cached[0])
+                status = f"20 {cached[1]}"
+            elif is_dir:
+                if ENABLE_DIR_LISTING:
+                    write(get_dir_listing(filepath, request.rstrip("/"), st[8]))
+                    status = "20 Directory Listing"
+                else:
+                    write(HDR_NOT_FOUND)
+                    status = "51 Not Found"
+            elif is_file and st[6] > STREAM_THRESHOLD:
+                # The file may have been cached before it grew past the threshold
+                file_cache.pop(filepath, None)
                 mime_type = get_mime_type(filepath)
-                writer.write(f"20 {mime_type}\r\n".encode())
-                writer.write(content)
-                status = f"20 {mime_type}"
+                try:
+                    streamed = await stream_file(writer, filepath, mime_type)
+                except OSError:
+                    # The 20 header and part of the body are already sent, so
+                    # just drop the connection instead of writing an error
+                    log_request(addr[0], request, f"20 {mime_type} (aborted)")
+                    return
+                if streamed:
+                    status = f"20 {mime_type} (streamed)"
+                else:
+                    write(HDR_NOT_FOUND)
+                    status = "51 Not Found"
+            elif is_file:
+                entry = get_file_response(filepath, st[8])
+                if entry:
+                    write(entry[0])
+                    status = f"20 {entry[1]}"
+                else:
+                    write(HDR_NOT_FOUND)
+                    status = "51 Not Found"
             else:
-                writer.write(b"51 Not Found\r\n")
+                write(HDR_NOT_FOUND)
                 status = "51 Not Found"
-        else:
-            writer.write(b"51 Not Found\r\n")
+        except:
+            write(HDR_NOT_FOUND)
             status = "51 Not Found"
-    except:
-        writer.write(b"51 Not Found\r\n")
-        status = "51 Not Found"
 
-    log_request(addr[0], request, status)
-    await writer.drain()
-    writer.close()
-    await writer.wait_closed()
+        log_request(addr[0], request, status)
+        await writer.drain()
+    except OSError:
+        pass  # client went away before the response was flushed
+    finally:
+        writer.close()
+        await writer.wait_closed()
 
 # --- Secure File Transfer Server (mTLS) ---
-CHUNK_SIZE = 512
+# Frame: uint16 payload length | uint8 opcode | payload
+FRAME_HEADER = ">HB"
+FRAME_HEADER_SIZE = 3
+OP_LIST = 1     # payload: subdirectory (may be empty)
+OP_UPLOAD = 2   # payload: "<filename> <total_chunks>"
+OP_SEQ = 3      # payload: uint32 sequence number + chunk data
+OP_END = 4      # payload: filename
+OP_DELETE = 5   # payload: filename
+
+# Each handler gets the frame payload, the writer and the per-connection state
+async def file_op_seq(payload, writer, state):
+    upload = state["upload"]
+    if len(payload) < 4:
+        writer.write(b"ERROR Malformed SEQ frame\n")
+        await writer.drain()
+        return
+    seq_num = struct.unpack(">I", payload[:4])[0]
+    if upload and 0 <= seq_num < len(upload["chunks"]):
+        chunks = upload["chunks"]
+        if chunks[seq_num] is None:
+            upload["received"] += 1
+        chunks[seq_num] = payload[4:]
+
+async def file_op_list(payload, writer, state):
+    addr = state["addr"]
+    subdir = payload.decode().strip()
+    dir_path = safe_join(PUBLIC_ROOT, subdir)
+    if not dir_path or not path_exists(dir_path):
+        writer.write(b"ERROR Directory not found\n")
+        await writer.drain()
+        return
+
+    try:
+        entries = sorted(os.listdir(dir_path))
+        lines = []
+        for entry in entries:
+            full_path = safe_join(dir_path, entry)
+            if not full_path:
+                continue
+            try:
+                st = os.stat(full_path)
+                is_dir = st[0] & S_IFDIR
+                is_file = st[0] & S_IFREG
+                size = st[6] if is_file else 0
+                entry_type = "<DIR>" if is_dir else f"{size}B"
+                lines.append(f"{entry_type} {entry}")
+            except OSError:
+                lines.append(f"??? {entry}")
+        response = "\n".join(lines) + "\n"
+        writer.write(response.encode())
+        await writer.drain()
+        print(f"[{addr}] Sent directory listing for '{subdir}'")
+    except OSError:
+        writer.write(b"ERROR Cannot read directory\n")
+        await writer.drain()
+
+async def file_op_upload(payload, writer, state):
+    filename, total_chunks = payload.decode().split()
+    state["upload"] = {
+        "filename": filename,
+        "chunks": [None] * int(total_chunks),
+        "received": 0,
+    }
+
+async def file_op_end(payload, writer, state):
+    addr = state["addr"]
+    upload = state["upload"]
+    filename = payload.decode()
+    if not upload or upload["filename"] != filename:
+        return
+    chunks = upload["chunks"]
+    state["upload"] = None
+    if upload["received"] != len(chunks):
+        writer.write(f"ERROR UPLOAD {filename} incomplete ({upload['received']}/{len(chunks)} chunks)\n".encode())
+        await writer.drain()
+        print(f"[{addr}] Discarded incomplete upload '{filename}'")
+        return
+    save_path = safe_join(PUBLIC_ROOT, filename)
+    if save_path:
+        with open(save_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        invalidate_cache(save_path)
+        writer.write(f"OK UPLOAD {filename}\n".encode())
+        await writer.drain()
+        print(f"[{addr}] Saved '{filename}' in /public")
+
+async def file_op_delete(payload, writer, state):
+    addr = state["addr"]
+    filename = payload.decode().strip()
+    file_path = safe_join(PUBLIC_ROOT, filename)
+    if file_path and path_exists(file_path):
+        os.remove(file_path)
+        invalidate_cache(file_path)
+        writer.write(f"DELETED {filename}\n".encode())
+        await writer.drain()
+        print(f"[{addr}] Deleted '{filename}'")
+    else:
+        writer.write(f"ERROR {filename} not found\n".encode())
+        await writer.drain()
+
+FILE_HANDLERS = {
+    OP_LIST: file_op_list,
+    OP_UPLOAD: file_op_upload,
+    OP_SEQ: file_op_seq,
+    OP_END: file_op_end,
+    OP_DELETE: file_op_delete,
+}
 
 async def handle_file_client(reader, writer):
+    collect_if_low()
     addr = writer.get_extra_info("peername")
     print(f"[{addr}] Authenticated client connected")
-    ip_port = addr
-    if ip_port not in client_uploads:
-        client_uploads[ip_port] = {}
-    client_files = client_uploads[ip_port]
+    # upload: {"filename": str, "chunks": [bytes or None] * total, "received": int}
+    state = {"addr": addr, "upload": None}
 
     try:
         while True:
-            line = await reader.readline()
-            if not line:
+            try:
+                header = await reader.readexactly(FRAME_HEADER_SIZE)
+            except EOFError:
                 break
-            line = line.decode().strip()
-            
-            # LIST command
-            if line.startswith("LIST"):
-                parts = line.split(maxsplit=1)
-                subdir = parts[1] if len(parts) > 1 else ""
-                dir_path = safe_join(PUBLIC_DIR, subdir)
-                if not dir_path or not os.path.exists(dir_path):
-                    await writer.write(b"ERROR Directory not found\n")
-                    await writer.drain()
-                    continue
-
-                try:
-                    entries = sorted(os.listdir(dir_path))
-                    lines = []
-                    for entry in entries:
-                        full_path = safe_join(dir_path, entry)
-                        if not full_path:
-                            continue
-                        try:
-                            st = os.stat(full_path)
-                            is_dir = st[0] & 0x4000
-                            is_file = st[0] & 0x8000
-                            size = st[6] if is_file else 0
-                            entry_type = "<DIR>" if is_dir else f"{size}B"
-                            lines.append(f"{entry_type} {entry}")
-                        except OSError:
-                            lines.append(f"??? {entry}")
-                    response = "\n".join(lines) + "\n"
-                    await writer.write(response.encode())
-                    await writer.drain()
-                    print(f"[{addr}] Sent directory listing for '{subdir}'")
-                except OSError:
-                    await writer.write(b"ERROR Cannot read directory\n")
-                    await writer.drain()
-                continue
-
-            # START upload
-            if line.startswith("UPLOAD "):
-                _, filename, total_chunks = line.split()
-                total_chunks = int(total_chunks)
-                client_files[filename] = {"chunks": {}, "total": total_chunks}
-                continue
-
-            # END upload
-            elif line.startswith("END "):
-                filename = line[4:]
-                if filename in client_files:
-                    file_info = client_files.pop(filename)
-                    save_path = safe_join(PUBLIC_DIR, filename)
-                    if save_path:
-                        with open(save_path, "wb") as f:
-                            for i in range(file_info["total"]):
-                                f.write(file_info["chunks"].get(i, b""))
-                        await writer.write(f"OK UPLOAD {filename}\n".encode())
-                        await writer.drain()
-                        print(f"[{addr}] Saved '{filename}' in /public")
-                continue
-
-            # DELETE
-            elif line.startswith("DELETE "):
-                filename = line[7:].strip()
-                file_path = safe_join(PUBLIC_DIR, filename)
-                if file_path and os.path.exists(file_path):
-                    os.remove(file_path)
-                    await writer.write(f"DELETED {filename}\n".encode())
-                    await writer.drain()
-                    print(f"[{addr}] Deleted '{filename}'")
-                else:
-                    await writer.write(f"ERROR {filename} not found\n".encode())
-                    await writer.drain()
-                continue
-
-            # SEQ chunk
-            elif line.startswith("SEQ"):
-                sep = line.find("|")
-                if sep == -1:
-                    continue
-                seq_num = int(line[3:sep])
-                chunk_data = line[sep+1:].encode()
-                if client_files:
-                    last_file = list(client_files.keys())[-1]
-                    client_files[last_file]["chunks"][seq_num] = chunk_data
+            length, op = struct.unpack(FRAME_HEADER, header)
+            payload = await reader.readexactly(length) if length else b""
+            handler = FILE_HANDLERS.get(op)
+            if handler:
+                await handler(payload, writer, state)
 
     except Exception as e:
         print(f"[{addr}] File transfer error: {e}")
@@ -352,76 +549,79 @@ async def handle_file_client(reader, writer):
         await writer.wait_closed()
         print(f"[{addr}] Connection closed")
 
+# --- TLS contexts ---
+# Built once per process so certificates are parsed a single time and the
+# contexts outlive any restart of run_server
+gemini_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+gemini_context.load_cert_chain(CERT_PATH, keyfile=KEY_PATH)
+
+# Mutual TLS for file transfer; the file server only runs when the client CA
+# is present and loads, so a bare cert/key setup still serves Gemini
+def make_file_context():
+    if not path_exists(CA_CERT_PATH):
+        print(f"No client CA at {CA_CERT_PATH}; file server disabled")
+        return None
+    try:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(CERT_PATH, keyfile=KEY_PATH)
+        context.load_verify_locations(cafile=CA_CERT_PATH)
+        context.verify_mode = ssl.CERT_REQUIRED
+    except (OSError, ValueError) as e:
+        print(f"Cannot load client CA {CA_CERT_PATH} ({e}); file server disabled")
+        return None
+    return context
+
+file_context = make_file_context()
+
 # --- Run all servers ---
 async def run_server():
     global wlan
-    # TLS context for Gemini
-    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    context.load_cert_chain(CERT_PATH, keyfile=KEY_PATH)
-
     # Start Gemini server
-    gemini_server = await asyncio.start_server(handle_gemini_client, HOST, GEMINI_PORT, ssl=context)
+    gemini_server = await asyncio.start_server(handle_gemini_client, HOST, GEMINI_PORT, ssl=gemini_context)
     print(f"Gemini server listening on {HOST}:{GEMINI_PORT}...")
 
-    # TLS context for file transfer (mutual TLS)
-    file_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    file_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    file_sock.bind((HOST, FILE_PORT))
-    file_sock.listen(5)
-    file_sock.setblocking(False)
-    print(f"Secure file server (mTLS) listening on {HOST}:{FILE_PORT}")
-
-    async def file_server_loop():
-        loop = asyncio.get_event_loop()
-        while True:
-            try:
-                client_sock, addr = file_sock.accept()
-            except OSError:
-                await asyncio.sleep(0.1)
-                continue
+    # Start file server
+    file_server = None
+    if file_context:
+        file_server = await asyncio.start_server(handle_file_client, HOST, FILE_PORT, ssl=file_context)
+        print(f"Secure file server (mTLS) listening on {HOST}:{FILE_PORT}")
 
-            # Wrap TLS with client authentication
-            ssl_sock = ssl.wrap_socket(
-                client_sock,
-                server_side=True,
-                key=KEY_PATH,
-                cert=CERT_PATH
-                # MicroPython currently doesn’t enforce client certs
-            )
-            reader = asyncio.StreamReader(ssl_sock)
-            writer = asyncio.StreamWriter(ssl_sock, {})
-            asyncio.create_task(handle_file_client(reader, writer))
+    # Drop startup garbage once; afterwards GC only runs when an allocation
+    # fails (MicroPython's default threshold) or collect_if_low() fires
+    gc.collect()
 
     async def stats_loop():
-        global last_update
         while True:
-            now = time.ticks_ms()
-            if time.ticks_diff(now, last_update) >= UPDATE_INTERVAL * 1000:
-                display_stats(total_clients, max_clients_per_sec, start_time)
-                last_update = now
-            await asyncio.sleep(1)
+            await asyncio.sleep(UPDATE_INTERVAL)
+            flush_log()
+            if ENABLE_OLED:
+                display_stats(render_stats())
 
     try:
-        # Run all loops concurrently; Gemini server runs in background automatically
+        # Run all loops concurrently; both servers run in background automatically
         await asyncio.gather(
-            file_server_loop(),
             stats_loop(),
             wifi_watchdog()
         )
     except (KeyboardInterrupt, Exception) as e:
         print("Server interrupted:", e)
     finally:
+        flush_log()
         gemini_server.close()
         await gemini_server.wait_closed()
-        file_sock.close()
+        if file_server:
+            file_server.close()
+            await file_server.wait_closed()
         if ENABLE_OLED:
             oled.fill(0)
             oled.show()
         print("Server shutdown complete")
 
 # --- Main entrypoint ---
-if __name__ == "__main__":
-    wlan = connect_to_wifi()
-    if not wlan:
+async def boot():
+    if not await connect_to_wifi():
         raise SystemExit
-    asyncio.run(run_server())
+    await run_server()
+
+if __name__ == "__main__":
+    asyncio.run(boot())